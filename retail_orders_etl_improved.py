@@ -5,15 +5,37 @@
 # التحسين: تجميع المكتبات حسب الوظيفة مع التعليق على كل مجموعة
 
 import os
+import re
+import csv
+import queue
+import shutil
 import logging
 import zipfile
+from io import StringIO
+from functools import lru_cache
+from contextlib import closing
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
 
 import pandas as pd
 import numpy as np
 import sqlalchemy as sal
 from sqlalchemy import text
 
+# مكتبات اختيارية - الكود يعمل بدونها لكن بمسار أبطأ
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = pq = pa_csv = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # إعداد نظام تسجيل العمليات - غير موجود في النسخة الأصلية
 logging.basicConfig(
     level=logging.INFO,
@@ -42,6 +64,38 @@ CONFIG = {
     # ✅ نقطة قوة موجودة في الأصل - تم توسيعها هنا
     "na_values": ['Not Available', 'unknown', 'N/A', 'NA', '', 'null', 'none'],
 
+    # أنواع البيانات عند القراءة (بأسماء الأعمدة بعد التنظيف)
+    # ✅ الأداء: float32 بدل float64 الافتراضي يقلّص حجم أعمدة الأسعار للنصف
+    # ✅ الأعداد الصحيحة بأنواع nullable (Int16/Int32): قيمة فارغة واحدة لا تحوّل
+    #    العمود كاملاً إلى float64 كما يحدث مع int العادي
+    "dtypes": {
+        "list_price": "float32",
+        "cost_price": "float32",
+        "order_id": "Int32",
+        "postal_code": "Int32",
+        "quantity": "Int32",
+        "discount_percent": "Int16",
+    },
+    "date_columns": ["order_date"],
+    # أي عمود آخر غير مذكور في dtypes أو date_columns يُقرأ كنص
+
+    # أعمدة نصية بعدد قيم محدود - تُخزَّن كـ category بدل نصوص مكررة
+    "category_columns": [
+        "ship_mode", "segment", "country", "city", "state",
+        "region", "category", "sub_category",
+    ],
+
+    # عدد الصفوف في كل دفعة قراءة/تحميل
+    # ✅ الأداء: الذاكرة تتناسب مع حجم الدفعة وليس مع حجم الملف
+    "chunksize": 200_000,
+
+    # محلل CSV: "pyarrow" (متعدد الخيوط، يحتاج مكتبة pyarrow) أو "c" (محلل pandas)
+    "csv_engine": "pyarrow",
+    # حجم كتلة القراءة لمحلل pyarrow بالبايت (~ حجم دفعة واحدة)
+    "csv_block_size": 32 * 1024 * 1024,
+    # قراءة الملف عبر mmap مباشرة من ذاكرة نظام التشغيل بدل نسخه لذاكرة بايثون
+    "csv_memory_map": True,
+
     # إعدادات قاعدة البيانات
     # ❌ في الأصل: اسم جهاز محدد (ANKIT\\SQLEXPRESS) - غير محمول
     # ✅ التحسين: استخدام متغيرات بيئة أو SQLite كبديل محمول
@@ -49,7 +103,29 @@ CONFIG = {
         "DB_CONNECTION_STRING",
         "sqlite:///retail_orders.db"  # بديل محمول يعمل على أي جهاز
     ),
+    # عدد الاتصالات المحفوظة في مجمع الاتصالات (لغير SQLite)
+    "db_pool_size": 4,
     "table_name": "df_orders",
+
+    # نسخة Parquet من البيانات المحوّلة لإعادة الاستخدام (None لتعطيلها)
+    # ✅ الأداء: ضغط ZSTD مع dictionary encoding، وقراءة الأعمدة المطلوبة فقط
+    "parquet_file": "orders.parquet",
+    "parquet_compression": "zstd",
+    "parquet_row_group_size": 200_000,
+
+    # عدد الصفوف في كل عملية إدراج
+    # ✅ الأداء: دفعات 10k-100k تقلل عدد الرحلات لقاعدة البيانات بشكل كبير
+    "sql_chunksize": 50_000,
+    # طول أعمدة النصوص في الجدول، والأعمدة التي تُفهرس بعد التحميل
+    "sql_string_length": 64,
+    "sql_index_columns": ["order_date"],
+
+    # أقصى عدد دفعات محوّلة تنتظر التحميل في نفس الوقت
+    # (يحدد الذاكرة القصوى عندما يكون التحميل أبطأ من التحويل)
+    "queue_size": 2,
+
+    # حجم مخزن النسخ عند فك الضغط (1 MB بدل 64 KB الافتراضي)
+    "copy_buffer_size": 1 << 20,
 }
 
 
@@ -63,71 +139,311 @@ def extract_data() -> str:
     ❌ مشكلة في الأصل: لا يوجد error handling
        لو فشل التحميل ينهار الكود بالكامل
     ✅ التحسين: try-except مع رسائل واضحة
+    ✅ الأداء: تعمل في خيط منفصل (run_pipeline) - التحميل (عملية انتظار شبكة)
+       لا يوقف باقي المراحل، فيتم اختبار الاتصال بقاعدة البيانات أثناءه
     """
     logger.info("⬇️  بدء تحميل البيانات من Kaggle...")
 
     try:
-        # تحميل من Kaggle
-        os.system(
-            f'kaggle datasets download {CONFIG["dataset"]} '
-            f'-f {CONFIG["csv_file"]}'
-        )
+        # ❌ في الأصل: os.system يتجاهل فشل الأمر - رمز الخروج لا يُفحص
+        _download_dataset()
         logger.info("✅ تم التحميل بنجاح")
     except Exception as e:
         logger.error(f"❌ فشل التحميل: {e}")
         raise
 
     # فك الضغط
+    # بعض إصدارات Kaggle API تحفظ الملف غير مضغوط مباشرة
+    if not os.path.exists(CONFIG["zip_file"]) and os.path.exists(CONFIG["csv_file"]):
+        logger.info("✅ الملف غير مضغوط - لا حاجة لفك الضغط")
+    else:
+        _unzip(CONFIG["zip_file"])
+
+    return CONFIG["csv_file"]
+
+
+def _download_dataset() -> None:
+    """
+    تحميل ملف البيانات عبر Kaggle Python API
+
+    ✅ الأداء: استدعاء مباشر داخل نفس العملية بدل os.system الذي يشغّل
+       shell ثم مفسّر Python ثانٍ لأداة kaggle، والأخطاء تصل كاستثناءات Python
+    """
+    # الاستيراد داخل الدالة: import kaggle يتحقق من بيانات الاعتماد فوراً
+    # ويفشل إذا لم تكن مضبوطة، حتى لو لم نحتج التحميل
+    from kaggle.api.kaggle_api_extended import KaggleApi
+
+    api = KaggleApi()
+    api.authenticate()
+    api.dataset_download_file(CONFIG["dataset"], CONFIG["csv_file"], path='.', force=False)
+
+
+def _extract_member(zip_path: str, member: str, dest: str = '.') -> str:
+    """
+    فك ضغط ملف واحد من الأرشيف عبر ZipFile مستقل
+
+    كل استدعاء يفتح الأرشيف بواصف ملف خاص به، فيمكن فك عدة ملفات بالتوازي
+    دون التنافس على قفل ZipFile واحد مشترك
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        info = zip_ref.getinfo(member)
+        if info.is_dir():
+            return zip_ref.extract(info, dest)
+
+        # ✅ حماية من المسارات الخارجة عن مجلد الوجهة (zip slip)،
+        #    كما يفعل extractall
+        root = os.path.realpath(dest)
+        target = os.path.realpath(os.path.join(root, member))
+        if os.path.commonpath([root, target]) != root:
+            raise zipfile.BadZipFile(f"مسار غير آمن داخل الأرشيف: {member}")
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with zip_ref.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=CONFIG["copy_buffer_size"])
+    return target
+
+
+def _unzip(zip_path: str) -> None:
+    """
+    فك ضغط ملف البيانات في المجلد الحالي
+
+    ✅ الأداء: extractall يفك الملفات واحداً تلو الآخر على نواة واحدة.
+       هنا كل ملف يُفك في خيط مستقل (zlib يحرر الـ GIL أثناء فك الضغط)،
+       ومع ملف واحد فقط نتجنب إنشاء الخيوط
+    """
     try:
-        with zipfile.ZipFile(CONFIG["zip_file"], 'r') as zip_ref:
-            zip_ref.extractall()
-            # ✅ التحسين: استخدام context manager (with)
-            # ❌ في الأصل: فتح وإغلاق يدوي - خطر نسيان الإغلاق
-        logger.info("✅ تم فك الضغط بنجاح")
+        # ✅ التحسين: استخدام context manager (with)
+        # ❌ في الأصل: فتح وإغلاق يدوي - خطر نسيان الإغلاق
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            members = zip_ref.namelist()
+
+        if len(members) == 1:
+            _extract_member(zip_path, members[0])
+        else:
+            workers = min(len(members), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda name: _extract_member(zip_path, name), members))
+        logger.info(f"✅ تم فك الضغط بنجاح ({len(members)} ملف)")
     except FileNotFoundError:
-        logger.error(f"❌ الملف غير موجود: {CONFIG['zip_file']}")
+        logger.error(f"❌ الملف غير موجود: {zip_path}")
         raise
     except zipfile.BadZipFile:
         logger.error("❌ الملف تالف أو ليس ملف zip صالح")
         raise
 
-    return CONFIG["csv_file"]
-
 
 # =============================================================================
 # 4. تحويل البيانات (Transform)
 # =============================================================================
-def transform_data(filepath: str) -> pd.DataFrame:
+# نمط الرموز الخاصة في أسماء الأعمدة - يُترجَم مرة واحدة عند تحميل الملف
+_SPECIAL_CHARS = re.compile(r'[^a-z0-9_]+')
+
+
+def clean_column_names(columns: pd.Index) -> pd.Index:
     """
-    قراءة وتنظيف وتحويل البيانات
+    توحيد أسماء الأعمدة: أحرف صغيرة، بدون مسافات أو رموز خاصة
 
-    هذا القسم فيه أكبر المشاكل في النسخة الأصلية:
-    ❌ أغلب الكود معلّق (commented out) - يعني لا يعمل فعلياً!
-    ❌ لا يوجد تحقق من البيانات بعد كل خطوة
-    ❌ لا يوجد توثيق لمنطق الحسابات
+    ✅ الأداء: تعبير منتظم واحد مُترجَم مسبقاً لكل اسم، بدل أربع عمليات .str
+       كل منها يبني Index وسيطاً جديداً
     """
+    return pd.Index([
+        _SPECIAL_CHARS.sub('', col.strip().lower().replace(' ', '_'))
+        for col in columns
+    ])
 
-    # --- 4.1 قراءة البيانات ---
-    logger.info("📚 قراءة البيانات...")
-    df = pd.read_csv(filepath, na_values=CONFIG["na_values"])
 
-    # ✅ تحقق أولي - غير موجود في الأصل
-    logger.info(f"   عدد الصفوف: {len(df):,}")
-    logger.info(f"   عدد الأعمدة: {df.shape[1]}")
-    logger.info(f"   القيم الفارغة:\n{df.isnull().sum()[df.isnull().sum() > 0]}")
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    تصغير أنواع البيانات لتقليل استهلاك الذاكرة
 
-    # --- 4.2 تنظيف أسماء الأعمدة ---
-    # ❌ في الأصل: الكود معلّق! الأعمدة تبقى بأسمائها القديمة
-    # ✅ التحسين: تفعيل الكود مع حماية إضافية
-    original_columns = df.columns.tolist()
-    df.columns = (
-        df.columns
-        .str.lower()
-        .str.strip()              # إزالة المسافات الزائدة
-        .str.replace(' ', '_')
-        .str.replace('[^a-z0-9_]', '', regex=True)  # إزالة الرموز الخاصة
-    )
-    logger.info(f"   تم تنظيف الأعمدة: {dict(zip(original_columns, df.columns))}")
+    ❌ في الأصل: pandas يختار int64/float64 لكل عمود رقمي (8 بايت للصف)
+       ويخزن النصوص المكررة (مثل المنطقة والفئة) كنصوص كاملة
+    ✅ التحسين: أصغر نوع رقمي يتسع للقيم، و category للنصوص محدودة القيم
+    """
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes(include='float').columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+
+    for col in CONFIG["category_columns"]:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+# قيم null الافتراضية في pandas.read_csv (keep_default_na=True)
+# ✅ تُضاف لـ na_values في محلل pyarrow، لأن null_values فيه تستبدل قائمته الافتراضية
+#    بالكامل، حتى يعطي المحللان نفس النتيجة لنفس الملف
+_PANDAS_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+    'n/a', 'nan', 'null',
+]
+
+
+def read_csv_chunks(filepath: str, columns: pd.Index) -> Iterator[pd.DataFrame]:
+    """
+    قراءة الملف على دفعات بأسماء الأعمدة النظيفة
+
+    ✅ الأداء: محلل pyarrow يفك ويحوّل كتل الملف على عدة أنوية بالتوازي،
+       بينما محلل pandas الافتراضي يعمل على نواة واحدة.
+       إذا لم تكن pyarrow مثبتة نرجع لمحلل pandas بنفس الإعدادات.
+    ✅ الأداء: مع csv_memory_map يُقرأ الملف عبر mmap في المحللين،
+       فيقرأ المحلل الصفحات من ذاكرة نظام التشغيل دون نسخة وسيطة
+    """
+    dtypes = {col: t for col, t in CONFIG["dtypes"].items() if col in columns}
+    date_columns = [col for col in CONFIG["date_columns"] if col in columns]
+    text_columns = [col for col in columns if col not in dtypes and col not in date_columns]
+
+    if CONFIG["csv_engine"] == "pyarrow" and pa_csv is not None:
+        pandas_dtypes = {col: pd.api.types.pandas_dtype(t) for col, t in dtypes.items()}
+        arrow_types = {
+            col: pa.from_numpy_dtype(getattr(dtype, 'numpy_dtype', dtype))
+            for col, dtype in pandas_dtypes.items()
+        }
+        # ❌ Arrow يستنتج نوع كل عمود غير معلن من الكتلة الأولى فقط: عمود كل قيمه
+        #    فارغة في أول كتلة يصبح من نوع null، وتفشل القراءة عند أول قيمة بعدها
+        # ✅ كل الأعمدة لها نوع معلن: النصوص string، والتاريخ نص يُحوَّل بتنسيق ثابت
+        #    في خطوة تحويل التاريخ
+        arrow_types.update({col: pa.string() for col in text_columns + date_columns})
+        # الأعمدة nullable تبقى nullable بعد to_pandas بدل float64 عند وجود قيم فارغة.
+        # التحويل حسب نوع Arrow، وهذا آمن لأن Arrow يستنتج int64 فقط لباقي الأعمدة
+        nullable_types = {
+            arrow_types[col]: dtype
+            for col, dtype in pandas_dtypes.items()
+            if isinstance(dtype, pd.api.extensions.ExtensionDtype)
+        }
+
+        open_file = pa.memory_map if CONFIG["csv_memory_map"] else pa.OSFile
+        source = open_file(filepath, 'r')
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(
+                column_names=list(columns),
+                skip_rows=1,
+                block_size=CONFIG["csv_block_size"],
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=arrow_types,
+                null_values=list(dict.fromkeys(_PANDAS_NA_VALUES + CONFIG["na_values"])),
+                strings_can_be_null=True,
+            ),
+        )
+        with source, reader:
+            for batch in reader:
+                yield batch.to_pandas(date_as_object=False, types_mapper=nullable_types.get)
+        return
+
+    if CONFIG["csv_engine"] == "pyarrow":
+        logger.warning("⚠️  مكتبة pyarrow غير مثبتة، استخدام محلل pandas الافتراضي")
+
+    with pd.read_csv(
+        filepath,
+        header=0,
+        names=columns,
+        na_values=CONFIG["na_values"],
+        dtype={**dtypes, **dict.fromkeys(text_columns, 'str')},
+        parse_dates=date_columns,
+        # نفس التنسيق الثابت لخطوة تحويل التاريخ: بدون استنتاج تنسيق خاص بهذا المحلل،
+        # فالقيم بتنسيق آخر (مثل 02/01/2023) تصبح NaT في المحللين
+        date_format="%Y-%m-%d",
+        chunksize=CONFIG["chunksize"],
+        engine='c',
+        memory_map=CONFIG["csv_memory_map"],
+    ) as reader:
+        yield from reader
+
+
+if numba is not None:
+    # ❌ طبقة TBB (الافتراضية عند توفرها) قد تعلّق البرنامج عند الخروج إذا بدأت
+    #    من خيط غير الرئيسي، والنواة تُستدعى من خيط التحويل.
+    #    workqueue تكفي هنا لأن خيطاً واحداً فقط يستدعي النواة
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER = 'workqueue'
+
+    # fastmath مقتصر على 'contract' (دمج الضرب والجمع في FMA) بدل True الكامل،
+    # لأن True يفترض عدم وجود NaN والأسعار قد تكون فارغة
+    @numba.njit(parallel=True, fastmath={'contract'}, cache=True)
+    def _financials_kernel(lp, dp, cp, discount, sale, profit):
+        negative_sales = 0
+        negative_profits = 0
+        for i in numba.prange(lp.shape[0]):
+            d = np.float64(lp[i]) * dp[i] * 0.01
+            s = lp[i] - d
+            p = s - cp[i]
+            discount[i] = d
+            sale[i] = s
+            profit[i] = p
+            # عدّاد الصفوف السالبة (reduction عبر الخيوط)؛ NaN < 0 خطأ فلا تُعد
+            if s < 0:
+                negative_sales += 1
+            if p < 0:
+                negative_profits += 1
+        return negative_sales, negative_profits
+else:
+    _financials_kernel = None
+
+
+def compute_financials(
+    lp: np.ndarray, dp: np.ndarray, cp: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+    """
+    حساب (الخصم، سعر البيع، الربح) من سعر القائمة ونسبة الخصم وسعر التكلفة،
+    مع عدد الصفوف ذات سعر البيع أو الربح السالب
+
+        الخصم     = سعر القائمة × نسبة الخصم / 100
+        سعر البيع = سعر القائمة - الخصم
+        الربح     = سعر البيع - سعر التكلفة
+
+    ✅ الأداء: مع numba تُحسب الأعمدة الثلاثة في حلقة واحدة مُترجمة ومتوازية
+       (قراءة واحدة لكل مصفوفة مدخلة)، وبدونها نرجع لعمليات NumPy
+    ✅ الأداء: النتائج تُكتب في مصفوفات محجوزة مسبقاً (out=) بدل مصفوفة مؤقتة
+       جديدة لكل عملية حسابية
+    ✅ الأداء: الصفوف السالبة تُعد داخل نفس الحلقة مع numba، وبـ count_nonzero
+       في NumPy، بدل مسح عمودي الجدول الناتج مرة أخرى بعد الحساب
+
+    ❌ المدخلات float32 لتوفير الذاكرة فقط: الحساب والنتائج بدقة float64،
+       وإلا يُخزَّن 934.92 كـ 934.9199829101562 في قاعدة البيانات و Parquet
+    """
+    discount = np.empty(lp.shape, dtype=np.float64)
+    sale = np.empty_like(discount)
+    profit = np.empty_like(discount)
+
+    if _financials_kernel is not None:
+        negative_sales, negative_profits = _financials_kernel(lp, dp, cp, discount, sale, profit)
+    else:
+        np.multiply(lp, dp, out=discount, dtype=np.float64)
+        np.multiply(discount, 0.01, out=discount)
+        np.subtract(lp, discount, out=sale)
+        np.subtract(sale, cp, out=profit)
+        negative_sales = np.count_nonzero(sale < 0)
+        negative_profits = np.count_nonzero(profit < 0)
+
+    checks = {'negative_sales': int(negative_sales), 'negative_profits': int(negative_profits)}
+    return discount, sale, profit, checks
+
+
+def _numeric_array(series: pd.Series) -> np.ndarray:
+    """
+    مصفوفة NumPy رقمية للحساب
+
+    الأعمدة nullable (مثل Int16) تُحوَّل إلى float32 مع NaN مكان NA، لأن to_numpy()
+    المباشر يعطي مصفوفة object عند وجود قيم فارغة. الأعمدة العادية تُعاد بدون نسخ
+    """
+    if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series.to_numpy(dtype=np.float32, na_value=np.nan)
+    return series.to_numpy()
+
+
+def transform_chunk(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    تحويل دفعة واحدة من البيانات: الأنواع، الأعمدة المشتقة، التاريخ والتنظيف
+
+    تُستدعى لكل دفعة على حدة، لذلك لا تعتمد على أي حالة من دفعات سابقة.
+    تُعيد الدفعة المحوّلة مع عدد الصفوف السالبة فيها (انظر compute_financials)
+    """
+    df = optimize_dtypes(df)
 
     # --- 4.3 اشتقاق الأعمدة الجديدة ---
     """
@@ -140,67 +456,523 @@ def transform_data(filepath: str) -> pd.DataFrame:
     ✅ التحسين: تفعيل مع توثيق واضح وتحقق
     """
 
-    # التحقق من وجود الأعمدة المطلوبة قبل الحساب
-    required_cols = ['list_price', 'discount_percent', 'cost_price']
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        raise ValueError(f"❌ أعمدة مفقودة: {missing_cols}")
+    # ✅ الأداء: سحب الأعمدة كمصفوفات NumPy مرة واحدة بدل ثلاث Series وسيطة
+    lp = _numeric_array(df['list_price'])
+    cp = _numeric_array(df['cost_price'])
+    dp = _numeric_array(df['discount_percent'])
 
-    # حساب الخصم: قيمة الخصم = سعر القائمة × (نسبة الخصم / 100)
-    df['discount'] = df['list_price'] * df['discount_percent'] * 0.01
+    discount, sale, profit, checks = compute_financials(lp, dp, cp)
 
-    # سعر البيع = سعر القائمة - قيمة الخصم
-    df['sale_price'] = df['list_price'] - df['discount']
+    # --- 4.4 تحويل التاريخ ---
+    # ✅ في الأصل: موجود لكن بدون error handling
+    # ✅ الأداء: محلل pandas يحوّل التاريخ أثناء القراءة (parse_dates)، وهذه الخطوة
+    #    تعمل مع محلل pyarrow (التاريخ يُقرأ كنص) أو إذا فشل المحلل في التعرف على التنسيق
+    # ✅ cache=True يحوّل كل تاريخ مميز مرة واحدة (آلاف التواريخ مقابل ملايين الصفوف)
+    # ❌ في الأصل: الرجوع لـ infer_datetime_format يعيد تحليل العمود كاملاً نصاً نصاً
+    #    (والخيار ملغى في pandas 2)؛ القيم غير الصالحة تصبح NaT وتُسجَّل بدلاً من ذلك
+    if not pd.api.types.is_datetime64_any_dtype(df['order_date']):
+        raw_dates = df['order_date']
+        df['order_date'] = pd.to_datetime(
+            raw_dates, format="%Y-%m-%d", cache=True, errors='coerce'
+        )
+        invalid_dates = int((df['order_date'].isna() & raw_dates.notna()).sum())
+        if invalid_dates > 0:
+            logger.warning(f"⚠️  يوجد {invalid_dates} تاريخ بتنسيق غير صالح (تم تحويله إلى NaT)")
 
-    # الربح = سعر البيع - سعر التكلفة
-    df['profit'] = df['sale_price'] - df['cost_price']
+    # --- 4.5 حذف الأعمدة المؤقتة وإضافة الأعمدة المشتقة ---
+    # ✅ الأداء: بناء الجدول الناتج بالإسقاط (projection) ثم assign،
+    #    بدل إضافة الأعمدة الثلاثة ثم drop(inplace=True) الذي ينسخ الجدول
+    #    مع وجود الأعمدة الستة معاً في الذاكرة
+    cols_to_drop = ['list_price', 'cost_price', 'discount_percent']
+    df = (
+        df[[col for col in df.columns if col not in cols_to_drop]]
+        .assign(discount=discount, sale_price=sale, profit=profit)
+    )
+    return df, checks
 
-    # ✅ تحقق من منطقية الحسابات - غير موجود في الأصل
-    negative_profit_count = (df['profit'] < 0).sum()
-    negative_sale_count = (df['sale_price'] < 0).sum()
 
-    if negative_sale_count > 0:
-        logger.warning(f"⚠️  يوجد {negative_sale_count} صف بسعر بيع سالب!")
-    if negative_profit_count > 0:
-        logger.warning(
-            f"⚠️  يوجد {negative_profit_count} صف بربح سالب "
-            f"({negative_profit_count/len(df)*100:.1f}% من البيانات)"
-        )
+def _chunk_totals(chunk: pd.DataFrame) -> dict:
+    """
+    ملخص دفعة واحدة في قاموس واحد: عدد الصفوف، المبيعات، الأرباح ونطاق التواريخ
 
-    # --- 4.4 تحويل التاريخ ---
-    # ✅ في الأصل: موجود لكن بدون error handling
-    try:
-        df['order_date'] = pd.to_datetime(df['order_date'], format="%Y-%m-%d")
-    except ValueError:
-        logger.warning("⚠️  تنسيق التاريخ غير متطابق، محاولة التحويل التلقائي...")
-        df['order_date'] = pd.to_datetime(df['order_date'], infer_datetime_format=True)
+    ✅ الأداء: كل عمود يُمسح مرة واحدة فقط - المجاميع مباشرة على مصفوفات NumPy،
+       و min/max للتاريخ في استدعاء agg واحد
+    ❌ agg({'sale_price': 'sum'}) على أعمدة float32 يعيد float32 ويفقد الكسور
+       (وحتى دولارات كاملة) في المجاميع الكبيرة، لذلك الجمع بدقة float64
+       (nansum يتجاهل الأسعار الفارغة كما يفعل sum في pandas)
+    """
+    date_range = chunk['order_date'].agg(['min', 'max'])
+    return {
+        'rows': len(chunk),
+        'sales': float(np.nansum(chunk['sale_price'].to_numpy(), dtype=np.float64)),
+        'profit': float(np.nansum(chunk['profit'].to_numpy(), dtype=np.float64)),
+        'min_date': date_range['min'],
+        'max_date': date_range['max'],
+    }
 
-    # --- 4.5 حذف الأعمدة المؤقتة ---
-    # ✅ التحسين: التحقق من وجود الأعمدة قبل الحذف
-    cols_to_drop = ['list_price', 'cost_price', 'discount_percent']
-    existing_to_drop = [col for col in cols_to_drop if col in df.columns]
-    df.drop(columns=existing_to_drop, inplace=True)
+
+def _date_bound(bound, *dates):
+    """
+    أول/آخر تاريخ (bound = min أو max) مع تجاهل NaT
+
+    ❌ min/max العادية تعتمد على الترتيب مع NaT: دفعة أولى كل تواريخها فارغة
+       تجعل نطاق الملف كله NaT
+    """
+    valid = [date for date in dates if pd.notna(date)]
+    return bound(valid) if valid else pd.NaT
+
+
+def _merge_totals(totals: Optional[dict], chunk_totals: dict) -> dict:
+    """دمج ملخص دفعة جديدة مع الملخص التراكمي"""
+    if totals is None:
+        return chunk_totals
+    return {
+        'rows': totals['rows'] + chunk_totals['rows'],
+        'sales': totals['sales'] + chunk_totals['sales'],
+        'profit': totals['profit'] + chunk_totals['profit'],
+        'negative_sales': totals['negative_sales'] + chunk_totals['negative_sales'],
+        'negative_profits': totals['negative_profits'] + chunk_totals['negative_profits'],
+        'min_date': _date_bound(min, totals['min_date'], chunk_totals['min_date']),
+        'max_date': _date_bound(max, totals['max_date'], chunk_totals['max_date']),
+    }
+
+
+def _log_summary(totals: dict, null_counts: pd.Series, output_columns: list) -> None:
+    """تسجيل التحقق والملخص النهائي بعد آخر دفعة"""
+    # ✅ تحقق أولي - غير موجود في الأصل
+    logger.info(f"   القيم الفارغة:\n{null_counts[null_counts > 0]}")
+
+    if totals['negative_sales'] > 0:
+        logger.warning(f"⚠️  يوجد {totals['negative_sales']} صف بسعر بيع سالب!")
+    if totals['negative_profits'] > 0:
+        logger.warning(
+            f"⚠️  يوجد {totals['negative_profits']} صف بربح سالب "
+            f"({totals['negative_profits']/totals['rows']*100:.1f}% من البيانات)"
+        )
 
     # --- 4.6 ملخص نهائي ---
     logger.info("=" * 50)
     logger.info("📊 ملخص البيانات بعد التحويل:")
-    logger.info(f"   الصفوف: {len(df):,}")
-    logger.info(f"   الأعمدة: {list(df.columns)}")
-    logger.info(f"   نطاق التواريخ: {df['order_date'].min()} → {df['order_date'].max()}")
-    logger.info(f"   إجمالي المبيعات: ${df['sale_price'].sum():,.2f}")
-    logger.info(f"   إجمالي الأرباح: ${df['profit'].sum():,.2f}")
-    logger.info(f"   هامش الربح: {df['profit'].sum()/df['sale_price'].sum()*100:.1f}%")
+    logger.info(f"   الصفوف: {totals['rows']:,}")
+    logger.info(f"   الأعمدة: {output_columns}")
+    logger.info(f"   نطاق التواريخ: {totals['min_date']} → {totals['max_date']}")
+    logger.info(f"   إجمالي المبيعات: ${totals['sales']:,.2f}")
+    logger.info(f"   إجمالي الأرباح: ${totals['profit']:,.2f}")
+    # ❌ المجاميع أرقام float عادية: القسمة على صفر ترفع ZeroDivisionError
+    #    (كل الأسعار صفر أو فارغة) بدل nan كما في pandas
+    if totals['sales']:
+        logger.info(f"   هامش الربح: {totals['profit'] / totals['sales'] * 100:.1f}%")
+    else:
+        logger.info("   هامش الربح: غير متاح (إجمالي المبيعات صفر)")
     logger.info("=" * 50)
 
-    return df
+
+def transform_data(filepath: str) -> Iterator[pd.DataFrame]:
+    """
+    قراءة وتنظيف وتحويل البيانات على دفعات
+
+    هذا القسم فيه أكبر المشاكل في النسخة الأصلية:
+    ❌ أغلب الكود معلّق (commented out) - يعني لا يعمل فعلياً!
+    ❌ لا يوجد تحقق من البيانات بعد كل خطوة
+    ❌ لا يوجد توثيق لمنطق الحسابات
+
+    ✅ الأداء: الملف يُقرأ على دفعات (read_csv_chunks) بدل تحميله كاملاً،
+       فتبقى الذاكرة بحجم دفعة واحدة ويبدأ التحميل قبل انتهاء القراءة.
+       الدالة generator: الملخص النهائي يُسجَّل بعد استهلاك آخر دفعة.
+    """
+
+    # --- 4.1 تنظيف أسماء الأعمدة ---
+    # ❌ في الأصل: الكود معلّق! الأعمدة تبقى بأسمائها القديمة
+    # ✅ التحسين: تنظيف الأسماء من سطر العناوين قبل القراءة الكاملة
+    #    حتى نحدد أنواع البيانات بالأسماء النظيفة مباشرة
+    original_columns = pd.read_csv(filepath, nrows=0).columns
+    columns = clean_column_names(original_columns)
+    logger.info(f"   تم تنظيف الأعمدة: {dict(zip(original_columns, columns))}")
+
+    # التحقق من وجود الأعمدة المطلوبة قبل الحساب
+    # ✅ يتم قبل قراءة أي دفعة حتى لا يُمس الجدول في قاعدة البيانات
+    required_cols = ['list_price', 'discount_percent', 'cost_price', 'order_date']
+    missing_cols = [col for col in required_cols if col not in columns]
+    if missing_cols:
+        raise ValueError(f"❌ أعمدة مفقودة: {missing_cols}")
+
+    # --- 4.2 قراءة البيانات ---
+    logger.info("📚 قراءة البيانات...")
+    reader = read_csv_chunks(filepath, columns)
+
+    # إحصائيات تراكمية عبر الدفعات
+    totals = None
+    null_counts = None
+    output_columns = []
+
+    for chunk_no, chunk in enumerate(reader, start=1):
+        # ✅ حساب القيم الفارغة مرة واحدة لكل دفعة وتجميعها (isna بدل الاسم البديل isnull)
+        chunk_nulls = chunk.isna().sum()
+        null_counts = chunk_nulls if null_counts is None else null_counts + chunk_nulls
+
+        # ✅ تحقق من منطقية الحسابات - غير موجود في الأصل
+        #    (عدد الصفوف السالبة يُحسب مع الأعمدة نفسها في transform_chunk)
+        chunk, checks = transform_chunk(chunk)
+
+        totals = _merge_totals(totals, {**_chunk_totals(chunk), **checks})
+        output_columns = list(chunk.columns)
+
+        logger.info(
+            f"   الدفعة {chunk_no}: {len(chunk):,} صف "
+            f"({chunk.memory_usage(deep=True).sum() / 1024**2:.1f} MB)"
+        )
+        yield chunk
+
+    if totals is None or totals['rows'] == 0:
+        logger.warning("⚠️  الملف لا يحتوي على أي صفوف")
+        return
+
+    # ✅ الملخص للعرض فقط: أي خطأ فيه يُسجَّل ولا يُلغي التحميل، لأن هذه الخطوة
+    #    تعمل بعد تسليم آخر دفعة وفشل المولّد هنا يلغي معاملة التحميل كاملة
+    try:
+        _log_summary(totals, null_counts, output_columns)
+    except Exception as e:
+        logger.warning(f"⚠️  تعذّر حساب ملخص البيانات: {e}")
 
 
 # =============================================================================
 # 5. تحميل البيانات (Load)
 # =============================================================================
-def load_data(df: pd.DataFrame) -> None:
+def psql_insert_copy(table, conn, keys, data_iter) -> None:
     """
-    تحميل البيانات إلى قاعدة البيانات
+    إدراج دفعة في PostgreSQL عبر COPY بدل جمل INSERT
+
+    تُمرَّر لـ to_sql كـ method (وصفة pandas/SQLAlchemy المعروفة).
+    ✅ الأداء: COPY هو مسار التحميل الجماعي الأصلي في PostgreSQL،
+       أسرع بمراتب من INSERT متعدد الصفوف
+    """
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        buffer = StringIO()
+        csv.writer(buffer).writerows(data_iter)
+        buffer.seek(0)
+
+        columns = ', '.join(f'"{key}"' for key in keys)
+        table_name = f'{table.schema}.{table.name}' if table.schema else table.name
+        cur.copy_expert(f'COPY {table_name} ({columns}) FROM STDIN WITH CSV', buffer)
+
+
+# الأعمدة المشتقة في transform_chunk (بدقة float64، انظر compute_financials)
+_DERIVED_COLUMNS = ('discount', 'sale_price', 'profit')
+
+
+def _declared_dtype(col: str) -> str:
+    """
+    النوع المعلن لعمود في البيانات المحوّلة، ثابت لكل الدفعات
+
+    ❌ optimize_dtypes يختار الأنواع حسب محتوى كل دفعة (int8 في دفعة و int16 في أخرى،
+       أو float لعمود نصي كل قيمه فارغة)، فلا يصلح مخطط مبني من الدفعة الأولى
+    ✅ الأنواع من CONFIG: dtypes و date_columns، والأعمدة المشتقة float64،
+       وأي عمود آخر نص (نفس قاعدة read_csv_chunks)
+    """
+    if col in CONFIG["date_columns"]:
+        return 'datetime64[ms]'
+    if col in _DERIVED_COLUMNS:
+        return 'float64'
+    return CONFIG["dtypes"].get(col, 'string')
+
+
+def _arrow_type(dtype: str) -> "pa.DataType":
+    """نوع Arrow المقابل لنوع pandas معلن (الأنواع nullable بنوع قيمها نفسه)"""
+    if dtype == 'string':
+        return pa.string()
+    dtype = pd.api.types.pandas_dtype(dtype)
+    return pa.from_numpy_dtype(getattr(dtype, 'numpy_dtype', dtype))
+
+
+def _parquet_schema(columns: Iterable[str]) -> "pa.Schema":
+    """
+    مخطط Parquet ثابت لكل الدفعات، مبني من الأنواع المعلنة (_declared_dtype)
+
+    الأعمدة category تُكتب كنص (Parquet يطبق dictionary encoding عند الكتابة)
+    """
+    return pa.schema([pa.field(col, _arrow_type(_declared_dtype(col))) for col in columns])
+
+
+def write_parquet(chunks: Iterable[pd.DataFrame], path: str) -> Iterator[pd.DataFrame]:
+    """
+    كتابة الدفعات إلى ملف Parquet أثناء مرورها إلى التحميل
+
+    ❌ في الأصل: البيانات تُكتب في SQL فقط، وكل تحليل لاحق يدفع تكلفة قراءتها من القاعدة
+    ✅ التحسين: نسخة Parquet مضغوطة بجانب SQL، تُقرأ لاحقاً بـ
+       pd.read_parquet(path, columns=[...]) فلا يُقرأ من القرص إلا الأعمدة المطلوبة
+
+    الملف يُكتب باسم مؤقت، ولا يحل محل الملف السابق إلا عبر finish_parquet
+    بعد نجاح تحميل SQL، حتى لا تختلف النسختان إذا فشل التحميل
+    """
+    tmp_path = f"{path}.tmp"
+    # ملف مؤقت متبقٍ من تشغيل سابق توقف فجأة لا يجب أن يُنشر مع هذا التشغيل
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    if pq is None:
+        logger.warning("⚠️  مكتبة pyarrow غير مثبتة، تخطي كتابة ملف Parquet")
+        yield from chunks
+        return
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = _parquet_schema(chunk.columns)
+                writer = pq.ParquetWriter(
+                    tmp_path,
+                    schema,
+                    compression=CONFIG["parquet_compression"],
+                    use_dictionary=True,
+                )
+            writer.write_table(
+                table.cast(schema), row_group_size=CONFIG["parquet_row_group_size"]
+            )
+            yield chunk
+    except BaseException:
+        # فشل أو توقف قبل اكتمال البيانات - لا نترك ملفاً ناقصاً
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+
+    if writer is not None:
+        writer.close()
+
+
+def finish_parquet(path: str, loaded: bool) -> None:
+    """
+    نشر ملف Parquet المؤقت بعد نجاح تحميل SQL، أو حذفه عند الفشل
+
+    ❌ الاستبدال عند انتهاء الدفعات يسبق حفظ التحميل (commit): خيط التحميل قد
+       يفشل بعدها في آخر دفعات الطابور، فترجع قاعدة البيانات للبيانات السابقة
+       بينما استُبدل ملف Parquet بالبيانات الجديدة
+    """
+    tmp_path = f"{path}.tmp"
+    if not os.path.exists(tmp_path):
+        return
+    if loaded:
+        os.replace(tmp_path, path)
+        logger.info(f"✅ تم حفظ نسخة Parquet: {path}")
+    else:
+        os.remove(tmp_path)
+
+
+def _insert_method(engine: sal.engine.Engine):
+    """
+    اختيار طريقة الإدراج المناسبة لنوع قاعدة البيانات
+
+    - PostgreSQL (psycopg2): COPY
+    - غير ذلك: None = executemany بجملة INSERT واحدة مُحضّرة لكل الدفعة
+      ❌ 'multi' مع دفعات كبيرة يتجاوز حد المتغيرات في SQLite و SQL Server
+    """
+    if engine.dialect.name == 'postgresql' and engine.driver == 'psycopg2':
+        return psql_insert_copy
+    return None
+
+
+# إعدادات SQLite أثناء التحميل الجماعي فقط
+_SQLITE_BULK_PRAGMAS = {"synchronous": "OFF", "journal_mode": "MEMORY"}
+
+
+def _prepare_bulk_load(conn: sal.engine.Connection) -> dict:
+    """
+    ضبط اتصال التحميل للإدراج الجماعي (SQLite فقط)، وإرجاع الإعدادات السابقة
+
+    ✅ الأداء: journal في الذاكرة وبدون fsync.
+       آمن هنا لأن الجدول يُعاد بناؤه بالكامل في كل تشغيل، والإعدادات تُعاد
+       بعد التحميل (_restore_bulk_load) قبل أن يعود الاتصال للمجمع المشترك
+
+    تُستدعى قبل بدء المعاملة: SQLite لا يغيّر هذه الإعدادات داخل معاملة مفتوحة،
+    لذلك تُنفَّذ على اتصال DBAPI مباشرة حتى لا يبدأ SQLAlchemy معاملة تلقائياً
+    """
+    if conn.dialect.name != 'sqlite':
+        return {}
+    cursor = conn.connection.cursor()
+    try:
+        previous = {
+            name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in _SQLITE_BULK_PRAGMAS
+        }
+        for name, value in _SQLITE_BULK_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        return previous
+    finally:
+        cursor.close()
+
+
+def _restore_bulk_load(conn: sal.engine.Connection, previous: dict) -> None:
+    """
+    إرجاع إعدادات الاتصال كما كانت قبل _prepare_bulk_load
+
+    ❌ المحرك مشترك بين التشغيلات (get_engine)، فبدون ذلك يبقى synchronous=OFF
+       على الاتصال في المجمع لأي استخدام لاحق للمحرك
+    """
+    if not previous or conn.invalidated:
+        return
+    cursor = conn.connection.cursor()
+    try:
+        for name, value in previous.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _enable_sqlite_transactions(engine: sal.engine.Engine) -> None:
+    """
+    معاملات كاملة في SQLite (وصفة SQLAlchemy لـ pysqlite)
+
+    ❌ pysqlite لا يبدأ المعاملة إلا قبل أول INSERT، وينفذ DROP/CREATE قبلها
+       مباشرة (autocommit)، فالتحميل الفاشل يترك الجدول فارغاً بعد حذف بياناته
+    ✅ التحسين: تعطيل BEGIN الخاص بـ pysqlite وإرسال BEGIN صريح عند بداية كل
+       معاملة، فيشمل الـ rollback إعادة إنشاء الجدول أيضاً
+    """
+    @sal.event.listens_for(engine, "connect")
+    def _disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @sal.event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+def _engine_options(url: sal.engine.URL) -> dict:
+    """
+    خيارات create_engine الخاصة بكل نوع قاعدة بيانات
+
+    ✅ الأداء: SQLAlchemy لا يفعّل مساعدات psycopg2 السريعة لـ executemany
+       إلا إذا طُلب ذلك صراحة، وبدونها يُنفَّذ كل صف كجملة مستقلة
+    """
+    if url.get_backend_name() != 'postgresql' or url.get_driver_name() != 'psycopg2':
+        return {}
+
+    sa_major, sa_minor = (int(part) for part in sal.__version__.split('.')[:2])
+    if sa_major >= 2:
+        return {
+            "executemany_mode": 'values_plus_batch',
+            "insertmanyvalues_page_size": 10_000,
+            "executemany_batch_page_size": 10_000,
+        }
+    if (sa_major, sa_minor) >= (1, 4):
+        return {
+            "executemany_mode": 'values_plus_batch',
+            "executemany_values_page_size": 10_000,
+            "executemany_batch_page_size": 10_000,
+        }
+    return {"use_batch_mode": True}  # SQLAlchemy < 1.4
+
+
+@lru_cache(maxsize=1)
+def get_engine() -> sal.engine.Engine:
+    """
+    محرك قاعدة البيانات المشترك، مع ضبط خاص بكل نوع
+
+    ❌ إنشاء محرك جديد وإغلاقه (dispose) في كل تشغيل يعيد فتح الاتصال
+       (المصادقة و TLS) كلما استُدعيت main() أكثر من مرة في نفس العملية
+    ✅ التحسين: محرك واحد يُنشأ عند أول استدعاء ويُعاد استخدامه مع مجمع اتصالاته،
+       و pool_pre_ping يستبدل أي اتصال انقطع بين التشغيلات
+    """
+    url = sal.engine.make_url(CONFIG["db_connection"])
+    options = {"pool_pre_ping": True, **_engine_options(url)}
+    # SQLite ملف محلي بلا تكلفة اتصال، ومجمعه الافتراضي قد لا يقبل pool_size
+    if url.get_backend_name() != 'sqlite':
+        options["pool_size"] = CONFIG["db_pool_size"]
+    engine = sal.create_engine(url, **options)
+    if engine.dialect.name == 'sqlite' and engine.driver == 'pysqlite':
+        _enable_sqlite_transactions(engine)
+    return engine
+
+
+def check_connection(engine: sal.engine.Engine) -> None:
+    """اختبار الاتصال بقاعدة البيانات قبل بدء التحميل"""
+    logger.info(f"💾 الاتصال بقاعدة البيانات: {CONFIG['db_connection'][:30]}...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        logger.info("✅ الاتصال بقاعدة البيانات ناجح")
+    except sal.exc.OperationalError as e:
+        logger.error(f"❌ فشل الاتصال بقاعدة البيانات: {e}")
+        raise
+
+
+def _sql_type(col: str) -> sal.types.TypeEngine:
+    """
+    نوع العمود في قاعدة البيانات، من النوع المعلن وليس من محتوى الدفعة الأولى
+
+    ❌ عمود نصي كل قيمه فارغة في الدفعة الأولى كان يُنشأ FLOAT، و BIGINT أو INTEGER
+       حسب تصغير الدفعة الأولى؛ SQLite يتسامح، لكن PostgreSQL (COPY) و SQL Server
+       يرفضان الدفعات التالية
+    """
+    dtype = _declared_dtype(col)
+    if dtype == 'string':
+        return sal.String(CONFIG["sql_string_length"])
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return sal.Date()  # تواريخ الطلبات بدقة اليوم
+    if pd.api.types.is_bool_dtype(dtype):
+        return sal.Boolean()
+    if pd.api.types.is_integer_dtype(dtype):
+        return sal.BigInteger() if dtype.itemsize == 8 else sal.Integer()
+    return sal.Float()
+
+
+def create_orders_table(conn: sal.engine.Connection, columns: Iterable[str]) -> sal.Table:
+    """
+    إعادة إنشاء جدول الطلبات بأنواع أعمدة صريحة
+
+    ❌ if_exists='replace' يترك لـ pandas اختيار الأنواع: التاريخ كـ TIMESTAMP/TEXT
+       كامل والنصوص بلا طول، فيكبر حجم الصف ويصعب الفهرسة لاحقاً
+    ✅ التحسين: الجدول يُنشأ مسبقاً (Date، Integer، Float، String بطول محدد)
+       من الأنواع المعلنة (_declared_dtype) ثم تُضاف البيانات بـ 'append'
+    """
+    table = sal.Table(
+        CONFIG["table_name"],
+        sal.MetaData(),
+        *(sal.Column(col, _sql_type(col)) for col in columns),
+    )
+    table.drop(conn, checkfirst=True)
+    table.create(conn)
+    return table
+
+
+def _write_chunks(conn: sal.engine.Connection, chunks: Iterable[pd.DataFrame], insert_method) -> int:
+    """
+    كتابة الدفعات في جدول الطلبات داخل معاملة مفتوحة، وإرجاع عدد الصفوف
+
+    ✅ الجدول يُعاد إنشاؤه مع الدفعة الأولى لتجنب تكرار البيانات،
+       وكل الدفعات تُضاف بـ 'append' إلى نفس الجدول
+    """
+    loaded_rows = 0
+    table = None
+    for chunk in chunks:
+        if table is None:
+            table = create_orders_table(conn, chunk.columns)
+        chunk.to_sql(
+            CONFIG["table_name"],
+            con=conn,
+            index=False,
+            if_exists='append',
+            # أنواع الجدول نفسها، حتى تُحوَّل القيم (مثل التاريخ) بنفس الصيغة
+            dtype={col.name: col.type for col in table.columns},
+            chunksize=CONFIG["sql_chunksize"],  # ✅ تحميل على دفعات كبيرة
+            method=insert_method                # ✅ COPY أو executemany حسب القاعدة
+        )
+        loaded_rows += len(chunk)
+
+    # ✅ الأداء: إنشاء الفهارس بعد الإدراج الجماعي (وداخل نفس المعاملة)
+    #    أسرع من تحديثها مع كل صف
+    if table is not None:
+        for col in CONFIG["sql_index_columns"]:
+            if col in table.columns:
+                sal.Index(f"idx_{table.name}_{col}", table.c[col]).create(conn)
+    return loaded_rows
+
+
+def load_data(chunks: Iterable[pd.DataFrame], engine: sal.engine.Engine) -> None:
+    """
+    تحميل البيانات إلى قاعدة البيانات دفعة بدفعة
 
     ❌ مشاكل في الأصل:
        1. الاتصال مرتبط بجهاز محدد (ANKIT\\SQLEXPRESS)
@@ -208,30 +980,29 @@ def load_data(df: pd.DataFrame) -> None:
        3. لا يوجد إغلاق للاتصال
     ✅ التحسينات:
        1. اتصال محمول عبر متغيرات بيئة
-       2. استخدام 'replace' أولاً ثم 'append' حسب الحاجة
+       2. إعادة إنشاء الجدول بأنواع صريحة ثم 'append' لكل الدفعات
        3. إغلاق تلقائي مع context manager
+       4. كتابة كل دفعة فور تحويلها بدل انتظار الملف كاملاً
+
+    المحرك المشترك (get_engine) يُمرَّر من run_pipeline، لأن اختبار الاتصال يتم
+    بالتوازي مع التحميل؛ ولا يُغلق هنا، والاتصال يعود للمجمع بإعداداته الأصلية
     """
-    logger.info(f"💾 تحميل البيانات إلى: {CONFIG['db_connection'][:30]}...")
+    logger.info(f"💾 تحميل البيانات إلى: {CONFIG['table_name']}...")
 
     try:
-        engine = sal.create_engine(CONFIG["db_connection"])
+        insert_method = _insert_method(engine)
 
-        # اختبار الاتصال أولاً
+        # ✅ الأداء: معاملة واحدة لكل التحميل - تمرير الاتصال (وليس المحرك) لـ to_sql
+        #    يمنعه من فتح معاملة مستقلة (وfsync) لكل دفعة، وأي فشل يُلغي التحميل كاملاً
+        #    بما فيه حذف الجدول وإعادة إنشائه
         with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        logger.info("✅ الاتصال بقاعدة البيانات ناجح")
-
-        # تحميل البيانات
-        # ✅ استخدام 'replace' للتشغيل الأول لتجنب تكرار البيانات
-        df.to_sql(
-            CONFIG["table_name"],
-            con=engine,
-            index=False,
-            if_exists='replace',  # ❌ في الأصل: 'append' قد يّكرر البيانات
-            chunksize=1000,       # ✅ تحميل على دفعات لتحسين الأداء
-            method='multi'        # ✅ إدراج متعدد أسرع
-        )
-        logger.info(f"✅ تم تحميل {len(df):,} صف بنجاح")
+            previous_settings = _prepare_bulk_load(conn)
+            try:
+                with conn.begin():
+                    loaded_rows = _write_chunks(conn, chunks, insert_method)
+            finally:
+                _restore_bulk_load(conn, previous_settings)
+        logger.info(f"✅ تم تحميل {loaded_rows:,} صف بنجاح")
 
     except sal.exc.OperationalError as e:
         logger.error(f"❌ فشل الاتصال بقاعدة البيانات: {e}")
@@ -239,9 +1010,6 @@ def load_data(df: pd.DataFrame) -> None:
     except Exception as e:
         logger.error(f"❌ خطأ غير متوقع: {e}")
         raise
-    finally:
-        engine.dispose()
-        logger.info("🔒 تم إغلاق الاتصال")
 
 
 # =============================================================================
@@ -250,6 +1018,100 @@ def load_data(df: pd.DataFrame) -> None:
 # ❌ في الأصل: لا يوجد main function - الكود يعمل بشكل خطي
 # ✅ التحسين: هيكلة واضحة مع قياس الوقت
 
+# علامات نهاية الطابور بين خيط التحويل وخيط التحميل
+_END_OF_STREAM = object()
+_ABORT_STREAM = object()
+
+
+def _iter_queue(chunk_queue: queue.Queue) -> Iterator[pd.DataFrame]:
+    """قراءة الدفعات من الطابور حتى علامة النهاية"""
+    while True:
+        item = chunk_queue.get()
+        if item is _END_OF_STREAM:
+            return
+        if item is _ABORT_STREAM:
+            raise RuntimeError("توقف التحويل قبل اكتمال البيانات")
+        yield item
+
+
+def _put_while_running(chunk_queue: queue.Queue, item, loader: Future) -> bool:
+    """
+    وضع عنصر في الطابور ما دام خيط التحميل يعمل
+
+    ❌ put() العادي قد ينتظر للأبد إذا توقف خيط التحميل بخطأ والطابور ممتلئ
+    """
+    while not loader.done():
+        try:
+            chunk_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def transform_and_load(csv_path: str, engine: sal.engine.Engine) -> None:
+    """
+    تشغيل التحويل والتحميل بالتوازي
+
+    ✅ الأداء: خيط التحميل يكتب الدفعة الحالية في قاعدة البيانات بينما يقرأ
+       ويحوّل هذا الخيط الدفعة التالية، فالوقت الكلي ≈ أبطأ المرحلتين وليس مجموعهما
+    """
+    chunk_queue = queue.Queue(maxsize=CONFIG["queue_size"])
+
+    parquet_path = CONFIG["parquet_file"]
+    chunks = transform_data(csv_path)
+    if parquet_path:
+        chunks = write_parquet(chunks, parquet_path)
+
+    loaded = False
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='loader') as pool, \
+                closing(chunks):
+            loader = pool.submit(load_data, _iter_queue(chunk_queue), engine)
+            try:
+                for chunk in chunks:
+                    if not _put_while_running(chunk_queue, chunk, loader):
+                        break  # خيط التحميل توقف - خطؤه يظهر في loader.result()
+            except BaseException:
+                _put_while_running(chunk_queue, _ABORT_STREAM, loader)
+                raise
+            _put_while_running(chunk_queue, _END_OF_STREAM, loader)
+            loader.result()
+        loaded = True
+    finally:
+        # ✅ ملف Parquet يُنشر فقط بعد حفظ تحميل SQL، فتبقى النسختان متطابقتين
+        if parquet_path:
+            finish_parquet(parquet_path, loaded)
+
+
+def run_pipeline() -> None:
+    """
+    تنسيق المراحل: الاستخراج واختبار الاتصال بالتوازي، ثم التحويل والتحميل
+
+    ❌ asyncio.run لا يعمل داخل حلقة أحداث قائمة (Jupyter)، والتحويل داخل
+       asyncio.to_thread لا يصله الإلغاء: Ctrl-C ينتظر الخيط حتى يُكمل التحميل ويثبته
+    ✅ التحسين: خيطان عاديان للاستخراج واختبار الاتصال، ثم التحويل في الخيط الرئيسي
+       فيصل KeyboardInterrupt إلى transform_and_load ويُلغي معاملة التحميل
+    """
+    # ✅ المحرك مشترك بين التشغيلات ولا يُغلق هنا؛ الاتصالات تعود للمجمع
+    #    بعد كل استخدام وتُغلق عند انتهاء العملية
+    engine = get_engine()
+
+    # المرحلة 1: الاستخراج
+    # ✅ اختبار الاتصال بقاعدة البيانات يتم أثناء انتظار التحميل من Kaggle
+    #    (نتيجته تُقرأ أولاً لأنه أسرع، فيظهر خطأ الاتصال دون انتظار التحميل)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='extract') as pool:
+        extract = pool.submit(extract_data)
+        connection = pool.submit(check_connection, engine)
+        connection.result()
+        csv_path = extract.result()
+
+    # المرحلة 2 و 3: التحويل والتحميل
+    # ✅ transform_data تُنتج الدفعات تدريجياً، وخيط التحميل يكتب كل دفعة
+    #    في قاعدة البيانات أثناء تحويل الدفعة التالية
+    transform_and_load(csv_path, engine)
+
+
 def main():
     """تشغيل ETL Pipeline الكامل"""
     start_time = datetime.now()
@@ -257,14 +1119,7 @@ def main():
     logger.info("=" * 60)
 
     try:
-        # المرحلة 1: الاستخراج
-        csv_path = extract_data()
-
-        # المرحلة 2: التحويل
-        df = transform_data(csv_path)
-
-        # المرحلة 3: التحميل
-        load_data(df)
+        run_pipeline()
 
         elapsed = datetime.now() - start_time
         logger.info("=" * 60)